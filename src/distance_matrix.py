@@ -2,10 +2,16 @@ from collections.abc import Callable
 from pathlib import Path
 from typing import Literal, Self
 
+import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
 from positions import generate_positions
-from similarity import sorensen_dice_hamming
-from utils import logger
+from similarity import (
+    pack_positions,
+    pairwise_sorensen_dice_hamming,
+    sorensen_dice_hamming,
+)
+from utils import configure_logging, logger
 
 ChessColor = Literal["white", "black"]
 
@@ -18,6 +24,87 @@ class DistanceMatrix:
 
     def __init__(self, df: pd.DataFrame) -> None:
         self.df = df
+        # struct-of-arrays view of the hot columns: the samplers read these
+        # contiguous NumPy arrays, while self.df is kept only for I/O
+        self._distance = df["distance"].to_numpy(dtype=np.float32)
+        self._analyzed = df["analyzed"].to_numpy(dtype=np.bool_).copy()
+        self._mirror = df["mirror"].to_numpy(dtype=np.bool_)
+        self._not_mirror = ~self._mirror
+        # lazily rebuilt caches of the eligible row indices and their distance
+        # CDF; invalidated by mark_analyzed so repeated sampling does not
+        # recombine the masks or re-accumulate the weights
+        self._eligible: np.ndarray | None = None
+        self._cdf: np.ndarray | None = None
+        self._rng = np.random.default_rng(42)
+        # dense (N, N) view of the distances plus integer position codes per
+        # row, so scoring can run on contiguous arrays instead of joins
+        self.positions = np.sort(np.asarray(df["white"].unique(), dtype=object))
+        self._pos_index = {pos: i for i, pos in enumerate(self.positions)}
+        self._white_codes = df["white"].map(self._pos_index).to_numpy(dtype=np.int64)
+        self._black_codes = df["black"].map(self._pos_index).to_numpy(dtype=np.int64)
+        self._matrix = np.zeros(
+            (len(self.positions), len(self.positions)), dtype=np.float32
+        )
+        self._matrix[self._white_codes, self._black_codes] = self._distance
+        self._diagonal = np.diag(self._matrix).copy()
+        # summed distance of every candidate position to the analyzed pairs
+        # per color, maintained incrementally by mark_analyzed instead of
+        # being recomputed over all analyzed rows on every scoring call
+        white_counts = np.bincount(
+            self._white_codes[self._analyzed], minlength=len(self.positions)
+        )
+        black_counts = np.bincount(
+            self._black_codes[self._analyzed], minlength=len(self.positions)
+        )
+        self._white_sum = white_counts @ self._matrix - white_counts * self._diagonal
+        self._black_sum = self._matrix @ black_counts - black_counts * self._diagonal
+
+    def mark_analyzed(self, indices: list[int] | np.ndarray | pd.Index) -> None:
+        """Mark positions as analyzed, keeping the cached mask and the
+        per-color distance sums in sync.
+
+        Args:
+            indices: The row indices of the positions to mark
+        """
+        idx = np.asarray(indices)
+        idx = idx[~self._analyzed[idx]]
+        self.df.loc[idx, "analyzed"] = True
+        self._analyzed[idx] = True
+        self._eligible = None
+        self._cdf = None
+        # each newly analyzed pair adds one row/column contribution to the
+        # per-color sums (minus its own mirror term on the diagonal)
+        whites = self._white_codes[idx]
+        blacks = self._black_codes[idx]
+        self._white_sum += self._matrix[whites].sum(axis=0)
+        np.subtract.at(self._white_sum, whites, self._diagonal[whites])
+        self._black_sum += self._matrix[:, blacks].sum(axis=1)
+        np.subtract.at(self._black_sum, blacks, self._diagonal[blacks])
+
+    def _eligible_indices(self) -> np.ndarray:
+        """Get the row indices of unanalyzed, non-mirror positions."""
+        if self._eligible is None:
+            self._eligible = np.flatnonzero(~self._analyzed & self._not_mirror)
+        return self._eligible
+
+    def _weighted_sample(self, indices: np.ndarray, weights: np.ndarray) -> int:
+        """Draw one row index with probability proportional to its weight.
+
+        Inverse-CDF sampling: one cumulative sum and one binary search, both
+        C-level, instead of pandas/NumPy choice machinery normalizing the
+        weights per call.
+
+        Args:
+            indices: The candidate row indices
+            weights: The non-negative weight of each candidate
+
+        Returns:
+            The sampled row index
+        """
+        cdf = np.cumsum(weights, dtype=np.float64)
+        return int(
+            indices[np.searchsorted(cdf, self._rng.random() * cdf[-1], side="right")]
+        )
 
     @classmethod
     def from_similarity_func(
@@ -32,32 +119,116 @@ class DistanceMatrix:
         Returns:
             A DistanceMatrix instance
         """
-        # create a DataFrame with the cartesian product of the positions
-        distance_df = pd.MultiIndex.from_product(
-            [positions, positions], names=["white", "black"]
-        ).to_frame(index=False)
+        if similarity_func is sorensen_dice_hamming:
+            # vectorized kernel over the whole (N, N) grid instead of a
+            # Python-level call per pair
+            return cls._from_dense(
+                pairwise_sorensen_dice_hamming(positions), positions
+            )
 
-        distance_df["distance"] = distance_df.apply(
-            lambda x: similarity_func(x["white"], x["black"]), axis=1
+        matrix = np.array(
+            [[similarity_func(white, black) for black in positions] for white in positions],
+            dtype=np.float32,
         )
-        distance_df["analyzed"] = False
-        distance_df["mirror"] = distance_df["white"] == distance_df["black"]
-        distance_df["reverse"] = distance_df["white"].str[::-1] == distance_df["black"]
+        return cls._from_dense(matrix, positions)
+
+    @classmethod
+    def _from_dense(cls, matrix: np.ndarray, positions: list[str]) -> Self:
+        """Build the row-form DataFrame from a dense (N, N) distance matrix.
 
-        distance_df = distance_df.sort_values(by="distance").reset_index(drop=True)
+        Args:
+            matrix: The dense pairwise distance matrix
+            positions: The positions the matrix rows/columns refer to
+
+        Returns:
+            A DistanceMatrix instance
+        """
+        # build the cartesian product of the positions sorted by distance in
+        # one pass: a single argsort over the flat distances plus fancy
+        # indexing, instead of constructing the frame and re-sorting it;
+        # white/black are categoricals built straight from integer codes, so
+        # the ~N^2 rows never hold per-row Python strings
+        n = len(positions)
+        cat_dtype = pd.CategoricalDtype(categories=positions)
+        distances = np.asarray(matrix, dtype=np.float32).ravel()
+        order = np.argsort(distances, kind="stable")
+        white_codes = np.repeat(np.arange(n), n)[order]
+        black_codes = np.tile(np.arange(n), n)[order]
+        # reversing an 8-character position is a byte swap on its packed
+        # uint64 form, so the whole column is two vectorized comparisons
+        packed = pack_positions(positions)
+        distance_df = pd.DataFrame(
+            {
+                "white": pd.Categorical.from_codes(white_codes, dtype=cat_dtype),
+                "black": pd.Categorical.from_codes(black_codes, dtype=cat_dtype),
+                "distance": distances[order],
+                "analyzed": False,
+                "mirror": white_codes == black_codes,
+                "reverse": np.equal.outer(packed.byteswap(), packed).ravel()[order],
+            }
+        )
         return cls(distance_df)
 
+    def to_parquet(self, file_path: Path) -> None:
+        """Persist the row-form matrix as a compact parquet file.
+
+        The categorical white/black columns are written dictionary-encoded
+        and the float32 distances stay float32; zstd compression shrinks the
+        ~N^2 rows substantially compared to the default snappy output.
+
+        Args:
+            file_path: The path of the parquet file to write
+        """
+        self.df.to_parquet(file_path, engine="pyarrow", compression="zstd")
+
+    def to_npy(self, matrix_path: Path, positions_path: Path) -> None:
+        """Persist the dense float32 matrix and the position list.
+
+        The .npy form stores only the (N, N) distances contiguously; the
+        mirror/reverse flags are derivable and are rebuilt on load.
+
+        Args:
+            matrix_path: The path of the .npy file for the dense matrix
+            positions_path: The path of the text file for the positions
+        """
+        np.save(matrix_path, self._matrix)
+        positions_path.write_text("\n".join(self.positions) + "\n")
+
+    @classmethod
+    def from_npy(cls, matrix_path: Path, positions_path: Path) -> Self:
+        """Create a distance matrix from a dense .npy file and a position list.
+
+        The matrix is memory-mapped, so loading is zero-copy until the rows
+        are materialized.
+
+        Args:
+            matrix_path: The path of the .npy file with the dense matrix
+            positions_path: The path of the text file with the positions
+
+        Returns:
+            A DistanceMatrix instance
+        """
+        matrix = np.load(matrix_path, mmap_mode="r")
+        positions = positions_path.read_text().splitlines()
+        return cls._from_dense(matrix, positions)
+
     @classmethod
     def from_parquet(cls, file_path: Path) -> Self:
         """Create a distance matrix from a parquet file.
 
+        The file is read directly with pyarrow (memory-mapped, multi-threaded)
+        instead of going through `pd.read_parquet`, and the arrow table is
+        converted in place (`self_destruct`) so the ~N^2 rows are not held in
+        memory twice during the conversion.
+
         Args:
             file_path: The path to the parquet file
 
         Returns:
             A DistanceMatrix instance
         """
-        distance_df = pd.read_parquet(file_path)
+        table = pq.read_table(file_path, memory_map=True, use_threads=True)
+        distance_df = table.to_pandas(self_destruct=True, split_blocks=True)
         return cls(distance_df)
 
     def _get_distances_for_positions(
@@ -72,7 +243,7 @@ class DistanceMatrix:
         Returns:
             pd.DataFrame: A DataFrame with the distances for the positions
         """
-        return self.df[(self.df[color].isin(positions)) & (self.df.mirror == False)][
+        return self.df[self.df[color].isin(positions) & ~self.df.mirror][
             ["white", "black", "distance"]
         ]
 
@@ -91,11 +262,8 @@ class DistanceMatrix:
         opposite_color = "black" if color == "white" else "white"
         return (
             self._get_distances_for_positions(positions, color)
-            .groupby(opposite_color)
+            .groupby(opposite_color, observed=True)[["distance"]]
             .sum()
-            .drop(columns=[color])
-            .reset_index()
-            .set_index(opposite_color)
         )
 
     def get_weighted_random_sample(self) -> tuple[str, str]:
@@ -107,10 +275,18 @@ class DistanceMatrix:
         Returns:
             The white and black positions
         """
-        sample = self.df[
-            (self.df.analyzed == False) & (self.df.mirror == False)
-        ].sample(n=1, weights=self.df.distance, random_state=42)
-        return sample.white.iloc[0], sample.black.iloc[0]
+        eligible = self._eligible_indices()
+        if self._cdf is None:
+            self._cdf = np.cumsum(self._distance[eligible], dtype=np.float64)
+        idx = eligible[
+            np.searchsorted(
+                self._cdf, self._rng.random() * self._cdf[-1], side="right"
+            )
+        ]
+        return (
+            self.positions[self._white_codes[idx]],
+            self.positions[self._black_codes[idx]],
+        )
 
     def get_max_distance_sample(self) -> tuple[str, str]:
         """Get the white and black position with the maximum distance between them.
@@ -121,12 +297,12 @@ class DistanceMatrix:
         Returns:
             The white and black positions
         """
-        sorted_df = (
-            self.df[(self.df.analyzed == False) & (self.df.mirror == False)]
-            .sort_values(by="distance", ascending=False)
-            .iloc[0]
+        eligible = self._eligible_indices()
+        best = eligible[self._distance[eligible].argmax()]
+        return (
+            self.positions[self._white_codes[best]],
+            self.positions[self._black_codes[best]],
         )
-        return (sorted_df["white"], sorted_df["black"])
 
     def weighted_random_sample_from_diverse_position(
         self, color: ChessColor
@@ -140,20 +316,15 @@ class DistanceMatrix:
         Returns:
             The white and black positions
         """
-        most_diverse_position = (
-            self._get_sum_over_distances(
-                self.df[self.df.analyzed == True][color], color
-            )
-            .idxmax()
-            .to_numpy()[0]
-        )
-        df_unanalyzed_positions = self.df[
-            (self.df[color] == most_diverse_position) & (self.df.analyzed == False)
-        ]
-        position = df_unanalyzed_positions.sample(
-            n=1, weights=df_unanalyzed_positions.distance, random_state=42
+        sums = self._white_sum if color == "white" else self._black_sum
+        codes = self._white_codes if color == "white" else self._black_codes
+        most_diverse_code = sums.argmax()
+        candidates = np.flatnonzero((codes == most_diverse_code) & ~self._analyzed)
+        idx = self._weighted_sample(candidates, self._distance[candidates])
+        return (
+            self.positions[self._white_codes[idx]],
+            self.positions[self._black_codes[idx]],
         )
-        return position.white.iloc[0], position.black.iloc[0]
 
     def get_most_diverse_position(self, *, stochastic: bool) -> tuple[str, str]:
         """Get the white position that is most different from all analyzed white positions and the black position that is most different from all analyzed black positions.
@@ -170,60 +341,33 @@ class DistanceMatrix:
         Returns:
             The white and black positions
         """
-        df_analyzed = self.df[self.df.analyzed == True]
-
-        white_positions_weighted = self._get_sum_over_distances(
-            df_analyzed["white"], "white"
-        )
-        black_positions_weighted = self._get_sum_over_distances(
-            df_analyzed["black"], "black"
+        # diversity score per row of the (white, black) grid, using the
+        # incrementally maintained per-color sums
+        scores = (
+            self._white_sum[self._white_codes] + self._black_sum[self._black_codes]
         )
-
-        # Create a DataFrame with the Cartesian product of indices
-        index_product = pd.DataFrame(
-            index=pd.MultiIndex.from_product(
-                [white_positions_weighted.index, black_positions_weighted.index]
-            )
-        )
-        # Perform element-wise addition for each pair of indices
-        index_product["value_sum"] = (
-            white_positions_weighted.reindex(
-                index_product.index.get_level_values(0)
-            ).to_numpy()
-            + black_positions_weighted.reindex(
-                index_product.index.get_level_values(1)
-            ).to_numpy()
-        )
-
-        # reshape the DataFrame to have the white and black positions as columns and filter
-        diversity_df = index_product.reset_index()
-        diversity_df.columns = ["white", "black", "diversity_score"]
-
-        distance_df = self.df.merge(diversity_df, on=["white", "black"], how="outer")
-        distance_df = distance_df[
-            (distance_df.analyzed == False) & (distance_df.mirror == False)
-        ]
+        eligible = self._eligible_indices()
 
         # Get the index of the maximum value (if stochastic, sample weighted by the value)
         if stochastic:
-            sample = distance_df.sample(
-                n=1, weights=distance_df.diversity_score, random_state=42
-            ).iloc[0]
-            return (sample["white"], sample["black"])
+            idx = self._weighted_sample(eligible, scores[eligible])
         else:
-            sorted_df = distance_df.sort_values(
-                by="diversity_score", ascending=False
-            ).iloc[0]
-            return (sorted_df["white"], sorted_df["black"])
+            idx = eligible[scores[eligible].argmax()]
+        return (
+            self.positions[self._white_codes[idx]],
+            self.positions[self._black_codes[idx]],
+        )
 
 
 if __name__ == "__main__":
-    index = ["".join(pos) for pos in generate_positions()]
+    configure_logging()
+    index = list(generate_positions())
     distances = DistanceMatrix.from_similarity_func(
         positions=index, similarity_func=sorensen_dice_hamming
     )
     logger.info(distances.df)
-    distances.df.to_parquet("distances.parquet")
+    distances.to_parquet(Path("distances.parquet"))
+    distances.to_npy(Path("distances.npy"), Path("positions.txt"))
     distances.df.to_csv("distances.csv")
 
     # test distance matrix
@@ -234,7 +378,7 @@ if __name__ == "__main__":
     logger.info(sums)
 
     # test position sampling
-    distances.df.loc[distances.df.index[:5], "analyzed"] = True
+    distances.mark_analyzed(distances.df.index[:5])
     logger.info(distances.get_weighted_random_sample())
     logger.info(distances.get_max_distance_sample())
     logger.info(distances.weighted_random_sample_from_diverse_position("white"))
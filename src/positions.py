@@ -1,52 +1,172 @@
 from collections.abc import Generator
 from itertools import combinations
+from typing import Final
 
 from utils import logger
 
 NUMBER_OF_PIECES = 8
 
 
-def generate_positions() -> Generator[list[str], None, None]:
+# the ten ways to place two knights on the free squares left after the
+# bishops and queen, in Scharnagl order (ordinals into the free-square list)
+KNIGHT_POSITIONS: Final[tuple[tuple[int, int], ...]] = tuple(
+    combinations(range(5), 2)
+)
+
+# piece bytes for the decode buffer; mutating a bytearray avoids boxing a
+# str object per square before the final join
+_BISHOP, _KNIGHT, _QUEEN, _ROOK, _KING = b"bnqrk"
+
+# _NTH_SET_BIT[mask] lists the set bit positions of mask in ascending order,
+# so the n-th free square of an occupancy mask is one table lookup
+_NTH_SET_BIT: Final[tuple[tuple[int, ...], ...]] = tuple(
+    tuple(square for square in range(NUMBER_OF_PIECES) if mask >> square & 1)
+    for mask in range(256)
+)
+
+
+def get_chess960_position(scharnagl: int) -> str:
+    """Decode a Scharnagl number into its Chess960 starting position.
+
+    The digits of the number successively encode the light-squared bishop,
+    the dark-squared bishop, the queen's ordinal among the free squares and
+    the knight pair; the remaining squares are filled rook, king, rook.
+
+    Args:
+        scharnagl: The position number between 0 and 959
+
+    Returns:
+        The starting position as an 8-character piece string
+
+    Raises:
+        ValueError: If the number is outside the valid range
+    """
+    if not 0 <= scharnagl <= 959:  # noqa: PLR2004
+        msg = f"Invalid Scharnagl number {scharnagl}, must be between 0 and 959"
+        raise ValueError(msg)
+    rest, bishop_light = divmod(scharnagl, 4)
+    rest, bishop_dark = divmod(rest, 4)
+    knights, queen = divmod(rest, 6)
+
+    # track occupancy as a bitmask so "the n-th free square" is a table
+    # lookup instead of rebuilding free-square lists between placements
+    position = bytearray(NUMBER_OF_PIECES)
+    occupied = (1 << (bishop_light * 2 + 1)) | (1 << (bishop_dark * 2))
+    position[bishop_light * 2 + 1] = _BISHOP
+    position[bishop_dark * 2] = _BISHOP
+
+    queen_square = _NTH_SET_BIT[~occupied & 0xFF][queen]
+    position[queen_square] = _QUEEN
+    occupied |= 1 << queen_square
+
+    free = _NTH_SET_BIT[~occupied & 0xFF]
+    knight_a, knight_b = KNIGHT_POSITIONS[knights]
+    position[free[knight_a]] = _KNIGHT
+    position[free[knight_b]] = _KNIGHT
+    occupied |= (1 << free[knight_a]) | (1 << free[knight_b])
+
+    rook_a, king, rook_b = _NTH_SET_BIT[~occupied & 0xFF]
+    position[rook_a] = _ROOK
+    position[king] = _KING
+    position[rook_b] = _ROOK
+    return position.decode("ascii")
+
+
+# all 960 valid starting positions, materialized once at import in Scharnagl
+# order so the table index is the position number
+POSITION_TABLE: Final[tuple[str, ...]] = tuple(
+    get_chess960_position(number) for number in range(960)
+)
+
+# inverse of get_chess960_position over all 960 numbers, so encoding a
+# position is a single dict lookup instead of scanning squares and tables
+_SCHARNAGL_INDEX: Final[dict[str, int]] = {
+    position: number for number, position in enumerate(POSITION_TABLE)
+}
+
+
+def generate_positions() -> Generator[str, None, None]:
     """Generate all valid Chess960 starting positions.
 
-    The function generates all valid Chess960 starting positions by placing the
-    bishops on opposite colors, the knights and the queen in the remaining positions,
-    and the king between the rooks.
+    All positions are materialized in POSITION_TABLE at import, so this
+    simply yields the precomputed strings in Scharnagl order instead of
+    re-deriving the placements.
 
     Yields:
-        A generator of all valid Chess960 starting positions
+        Every valid Chess960 starting position as an 8-character string
     """
-    # place bishops on opposite colors
-    for bishop_a in range(0, 8, 2):
-        for bishop_b in range(1, 8, 2):
-            positions_without_bishop = set(range(8)) - {bishop_a, bishop_b}
-            # place knights
-            for knight_a, knight_b in combinations(positions_without_bishop, 2):
-                positions_without_bishops_or_knights = positions_without_bishop - {
-                    knight_a,
-                    knight_b,
-                }
-                # place queen
-                for queen in positions_without_bishops_or_knights:
-                    starting_position = ["r"] * 8
-
-                    # Assign the positions of the Bishops, Knights, and Queen
-                    starting_position[bishop_a] = "b"
-                    starting_position[bishop_b] = "b"
-                    starting_position[knight_a] = "n"
-                    starting_position[knight_b] = "n"
-                    starting_position[queen] = "q"
-
-                    # Assign the position of the King between the Rooks
-                    starting_position[
-                        starting_position.index("r", starting_position.index("r") + 1)
-                    ] = "k"
-                    yield starting_position
+    yield from POSITION_TABLE
+
+
+def get_scharnagl_number(position: str) -> int:
+    """Encode a Chess960 starting position into its Scharnagl number.
+
+    Args:
+        position: The starting position as an 8-character piece string
+
+    Returns:
+        The position number between 0 and 959
+
+    Raises:
+        ValueError: If the position is not a valid Chess960 position
+    """
+    try:
+        return _SCHARNAGL_INDEX[position]
+    except KeyError:
+        msg = f"Invalid Chess960 position {position}"
+        raise ValueError(msg) from None
+
+
+# membership in the set of all 960 valid positions replaces re-deriving the
+# placement rules on every validity check
+_VALID_POSITIONS: Final[frozenset[str]] = frozenset(POSITION_TABLE)
 
 
 def is_valid_chess960_position(sequence: str) -> bool:
     """Check if the sequence is a valid Chess960 position.
 
+    A single hash lookup against the precomputed position table; use
+    diagnose_position to find out which property an invalid sequence
+    violates.
+
+    Args:
+        sequence: The sequence of pieces in the starting position
+
+    Returns:
+        True if the sequence is a valid Chess960 position, False otherwise
+    """
+    return sequence in _VALID_POSITIONS
+
+
+def _scan_sequence(
+    sequence: str,
+) -> tuple[dict[str, int], int, int, int, int, int]:
+    """Collect piece counts and the rule-relevant squares in one pass.
+
+    Returns:
+        The piece counts and the squares of the first/last bishop, the
+        king and the first/last rook (-1 where a piece does not occur)
+    """
+    counts: dict[str, int] = {}
+    first_bishop = last_bishop = king = first_rook = last_rook = -1
+    for square, piece in enumerate(sequence):
+        counts[piece] = counts.get(piece, 0) + 1
+        if piece == "b":
+            last_bishop = square
+            if first_bishop < 0:
+                first_bishop = square
+        elif piece == "k":
+            king = square
+        elif piece == "r":
+            last_rook = square
+            if first_rook < 0:
+                first_rook = square
+    return counts, first_bishop, last_bishop, king, first_rook, last_rook
+
+
+def diagnose_position(sequence: str) -> bool:
+    """Check the Chess960 placement rules one by one, logging each violation.
+
     A valid Chess960 position has the following properties:
     - 2 bishops on opposite colors
     - the king is between the rooks
@@ -65,17 +185,17 @@ def is_valid_chess960_position(sequence: str) -> bool:
     if len(sequence) != NUMBER_OF_PIECES:
         logger.error(f"Invalid sequence length {len(sequence)}")
         valid = False
-    if sorted(sequence) != ["b", "b", "k", "n", "n", "q", "r", "r"]:
+    # a single scan replaces sorting plus repeated index/rindex calls
+    counts, first_bishop, last_bishop, king, first_rook, last_rook = (
+        _scan_sequence(sequence)
+    )
+    if counts != {"b": 2, "k": 1, "n": 2, "q": 1, "r": 2}:
         logger.error(f"Invalid piece counts or pieces in sequence {sequence}")
         valid = False
-    # check if there is on b on odd index and one b on even index
-    if sequence.index("b") % 2 == sequence.rindex("b") % 2:
+    if first_bishop >= 0 and first_bishop % 2 == last_bishop % 2:
         logger.error(f"Invalid sequence, bishops on same color in {sequence}")
         valid = False
-    # check if k between both r values
-    if sequence.index("k") < sequence.index("r") or sequence.index(
-        "k"
-    ) > sequence.rindex("r"):
+    if king >= 0 and not first_rook < king < last_rook:
         logger.error(f"Invalid sequence, king not between rooks in {sequence}")
         valid = False
     return valid
@@ -1,9 +1,18 @@
+import os
+from collections import Counter
 from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor
 from functools import cache
+from itertools import pairwise
 
 import numpy as np
 from positions import is_valid_chess960_position
-from utils import logger
+from utils import configure_logging, logger
+
+# the start/end edge pairs only depend on the first/last piece, so build the
+# ten possible tuples once instead of allocating them on every cache miss
+_START_EDGE = {piece: ("S", piece) for piece in "rnbqk"}
+_END_EDGE = {piece: (piece, "E") for piece in "rnbqk"}
 
 
 @cache
@@ -16,6 +25,7 @@ def generate_pairs(
     This function takes a string and generates a set of tuples, where each tuple represents a pair of consecutive characters in the string.
     The first tuple is always ("S", first_character) and the last tuple is always (last_character, "E"), representing the start and end of the sequence.
     If `consider_duplicate_pairs` is True, duplicate pairs are distinguished by adding a third element, 1, to the tuple.
+    The sequence must consist of the piece characters "rnbqk"; the edge tuples are precomputed per piece, so other characters raise a KeyError.
 
     Parameters:
         seq: The input string from which to generate pairs.
@@ -24,19 +34,17 @@ def generate_pairs(
     Returns:
         A set of tuples representing pairs of consecutive characters in the input string.
     """
-    pairs = set()
-
-    # this will consider edge pieces
-    pairs.add(("S", seq[0]))
-    pairs.add((seq[-1], "E"))
+    # this will consider edge pieces; the consecutive pairs are collected by
+    # a single pairwise-based constructor instead of a per-character loop
+    if not consider_duplicate_pairs:
+        return {_START_EDGE[seq[0]], _END_EDGE[seq[-1]], *pairwise(seq)}
 
-    for i in range(len(seq) - 1):
+    pairs = {_START_EDGE[seq[0]], _END_EDGE[seq[-1]]}
+    for pair, count in Counter(pairwise(seq)).items():
         # this distinguishes between one or two occurences of a pair
-        pair = (seq[i], seq[i + 1])
-        if consider_duplicate_pairs and pair in pairs:
-            pairs.add((seq[i], seq[i + 1], 1))
-        else:
-            pairs.add(pair)
+        pairs.add(pair)
+        if count > 1:
+            pairs.add((*pair, 1))
     return pairs
 
 
@@ -48,6 +56,10 @@ def local_similarity(
 
     This function generates pairs of consecutive characters from each sequence and applies the provided formula to calculate the similarity.
 
+    For the known set formulas (jaccard and sorensen_dice) the pair sets are
+    represented as cached uint64 bitmasks and the set sizes become popcounts,
+    skipping the per-call set operations entirely.
+
     Parameters:
         seq1: The first input sequence.
         seq2: The second input sequence.
@@ -56,6 +68,13 @@ def local_similarity(
     Returns:
         The similarity between the two input sequences, as calculated by the provided formula.
     """
+    if formula is jaccard or formula is sorensen_dice:
+        mask1, mask2 = _pair_bitmask(seq1), _pair_bitmask(seq2)
+        intersection = (mask1 & mask2).bit_count()
+        if formula is jaccard:
+            return intersection / (mask1 | mask2).bit_count()
+        return 2 * intersection / (mask1.bit_count() + mask2.bit_count())
+
     pairs1 = generate_pairs(seq1)
     pairs2 = generate_pairs(seq2)
 
@@ -68,6 +87,10 @@ def jaccard(pairs1: set[tuple], pairs2: set[tuple]) -> float:
 
     The Jaccard coefficient is defined as the size of the intersection divided by the size of the union of the two sets.
 
+    The intersection size is counted in a single membership pass and the
+    union size derived from it, avoiding the construction of two throwaway
+    sets per call.
+
     Parameters:
         pairs1: The first set of pairs.
         pairs2: The second set of pairs.
@@ -75,7 +98,8 @@ def jaccard(pairs1: set[tuple], pairs2: set[tuple]) -> float:
     Returns:
         The Jaccard coefficient between the two sets of pairs.
     """
-    return len(pairs1.intersection(pairs2)) / len(pairs1.union(pairs2))
+    intersection = sum(1 for pair in pairs1 if pair in pairs2)
+    return intersection / (len(pairs1) + len(pairs2) - intersection)
 
 
 def sorensen_dice(pairs1: set[tuple], pairs2: set[tuple]) -> float:
@@ -92,7 +116,8 @@ def sorensen_dice(pairs1: set[tuple], pairs2: set[tuple]) -> float:
     Returns:
         The Sorensen-Dice coefficient between the two sets of pairs.
     """
-    return 2 * len(pairs1.intersection(pairs2)) / (len(pairs1) + len(pairs2))
+    intersection = sum(1 for pair in pairs1 if pair in pairs2)
+    return 2 * intersection / (len(pairs1) + len(pairs2))
 
 
 def jaro(s1: str, s2: str) -> float:
@@ -101,6 +126,9 @@ def jaro(s1: str, s2: str) -> float:
 
     The Jaro similarity is defined as the average of the proportion of matched characters from each string and the proportion of transpositions, all divided by 3.
 
+    The match flags live in two int bitmasks instead of per-call boolean
+    lists, so the only allocations are small ints.
+
     Parameters:
         s1: The first input string.
         s2: The second input string.
@@ -108,8 +136,11 @@ def jaro(s1: str, s2: str) -> float:
     Returns:
         The Jaro similarity between the two input strings.
     """
-    s1_matches, s2_matches = [False] * 8, [False] * 8
+    if s1 == s2:
+        return 1.0
 
+    s1_matches = 0
+    s2_matches = 0
     matches = 0
     transpositions = 0
 
@@ -117,15 +148,15 @@ def jaro(s1: str, s2: str) -> float:
     for i in range(8):
         start = max(0, i - 3)
         end = min(i + 4, 8)
+        char = s1[i]
 
-        # Look for matches in the second string within a certain range
+        # Look for matches in the second string within a certain range,
+        # skipping positions that are already matched
         for j in range(start, end):
-            if s2_matches[j]:
+            if s2_matches >> j & 1 or char != s2[j]:
                 continue
-            if s1[i] != s2[j]:
-                continue
-            s1_matches[i] = True
-            s2_matches[j] = True
+            s1_matches |= 1 << i
+            s2_matches |= 1 << j
             matches += 1
             break
 
@@ -136,9 +167,9 @@ def jaro(s1: str, s2: str) -> float:
     k = 0
     # Count transpositions
     for i in range(8):
-        if not s1_matches[i]:
+        if not s1_matches >> i & 1:
             continue
-        while not s2_matches[k]:
+        while not s2_matches >> k & 1:
             k += 1
         if s1[i] != s2[k]:
             transpositions += 1
@@ -148,12 +179,25 @@ def jaro(s1: str, s2: str) -> float:
     return (matches / 8 + matches / 8 + (matches - transpositions / 2) / matches) / 3
 
 
+@cache
+def _levenshtein_masks(seq: str) -> dict[str, int]:
+    """Bitmask per character of the positions where it occurs in seq."""
+    masks: dict[str, int] = {}
+    for i, char in enumerate(seq):
+        masks[char] = masks.get(char, 0) | 1 << i
+    return masks
+
+
 def normalized_levenshtein(s1: str, s2: str) -> float:
     """
     Calculates the normalized Levenshtein distance between two strings.
 
     The Levenshtein distance is the minimum number of single-character edits (insertions, deletions or substitutions) required to change one string into the other.
     Normalization is done by dividing the Levenshtein distance by the length of the longest string.
+    Instead of filling a dynamic-programming matrix cell by cell, this uses the
+    Myers bit-parallel algorithm: the pattern fits in one machine word, so each
+    column of the matrix is advanced with a handful of bitwise operations on
+    per-character match masks.
 
     Parameters:
         s1: The first input string.
@@ -164,32 +208,35 @@ def normalized_levenshtein(s1: str, s2: str) -> float:
     """
     len_s1 = len(s1)
     len_s2 = len(s2)
-
-    # Ensure s1 is the shorter string for space optimization
-    if len_s1 > len_s2:
-        s1, s2 = s2, s1
-        len_s1, len_s2 = len_s2, len_s1
-
-    # Initialize only two rows of the matrix
-    previous_row = list(range(len_s2 + 1))
-    current_row = [0] * (len_s2 + 1)
-
-    # Fill in the rest of the matrix
-    for i in range(1, len_s1 + 1):
-        current_row[0] = i
-        for j in range(1, len_s2 + 1):
-            cost = 0 if s1[i - 1] == s2[j - 1] else 1
-            current_row[j] = min(
-                previous_row[j] + 1,  # Deletion
-                current_row[j - 1] + 1,  # Insertion
-                previous_row[j - 1] + cost,
-            )  # Substitution
-
-        # Swap current row with previous row for the next iteration
-        previous_row, current_row = current_row, previous_row
+    if not len_s1 or not len_s2:
+        return 1.0 if len_s1 != len_s2 else 0.0
+
+    match_masks = _levenshtein_masks(s1)
+    distance = len_s1
+    vertical_pos = (1 << len_s1) - 1
+    vertical_neg = 0
+    last_bit = 1 << (len_s1 - 1)
+    for char in s2:
+        eq = match_masks.get(char, 0)
+        diag_zero = (((eq & vertical_pos) + vertical_pos) ^ vertical_pos) | eq | vertical_neg
+        horizontal_pos = vertical_neg | ~(diag_zero | vertical_pos)
+        horizontal_neg = diag_zero & vertical_pos
+        if horizontal_pos & last_bit:
+            distance += 1
+        if horizontal_neg & last_bit:
+            distance -= 1
+        horizontal_pos = (horizontal_pos << 1) | 1
+        vertical_pos = (horizontal_neg << 1) | ~(diag_zero | horizontal_pos)
+        vertical_neg = diag_zero & horizontal_pos
 
     # Return the normalized Levenshtein distance
-    return previous_row[len_s2] / max(len_s1, len_s2)
+    return distance / max(len_s1, len_s2)
+
+
+@cache
+def _packed_int(seq: str) -> int:
+    """Pack a sequence's bytes into one little-endian integer."""
+    return int.from_bytes(seq.encode(), "little")
 
 
 def normalized_hamming(s1: str, s2: str) -> float:
@@ -199,6 +246,10 @@ def normalized_hamming(s1: str, s2: str) -> float:
     The Hamming distance is the number of positions at which the corresponding symbols are different.
     Normalization is done by dividing the Hamming distance by the length of the strings.
 
+    Both strings are packed into single integers (cached, since the same 960
+    positions recur), so the distance is an XOR, a fold of each byte onto its
+    lowest bit and a popcount — no arrays or per-character loop.
+
     Parameters:
         s1: The first input string.
         s2: The second input string.
@@ -206,8 +257,11 @@ def normalized_hamming(s1: str, s2: str) -> float:
     Returns:
         The normalized Hamming distance between the two input strings.
     """
-    seq1, seq2 = np.array(list(s1)), np.array(list(s2))
-    return np.sum(seq1 != seq2) / 8
+    xor = _packed_int(s1) ^ _packed_int(s2)
+    folded = (xor | (xor >> 4)) & 0x0F0F0F0F0F0F0F0F
+    folded = (folded | (folded >> 2)) & 0x0303030303030303
+    folded = (folded | (folded >> 1)) & 0x0101010101010101
+    return folded.bit_count() / 8
 
 
 def sorensen_dice_hamming(s1: str, s2: str) -> float:
@@ -217,6 +271,10 @@ def sorensen_dice_hamming(s1: str, s2: str) -> float:
     This function calculates the Sorensen-Dice similarity and the normalized Hamming distance between two strings,
     and returns the average of these two values.
 
+    Both halves read the cached per-sequence encodings directly — the pair
+    bitmasks for Sorensen-Dice and the packed ints for Hamming — so a call
+    touches no sets, arrays or dispatch through local_similarity.
+
     Parameters:
         s1: The first input string.
         s2: The second input string.
@@ -224,9 +282,107 @@ def sorensen_dice_hamming(s1: str, s2: str) -> float:
     Returns:
         The combined similarity score between the two input strings.
     """
+    mask1, mask2 = _pair_bitmask(s1), _pair_bitmask(s2)
+    dice = 2 * (mask1 & mask2).bit_count() / (mask1.bit_count() + mask2.bit_count())
+    return (1 - dice + normalized_hamming(s1, s2)) / 2
+
+
+# global mapping of pair tuples to bit indices, grown lazily; all pairs over
+# the chess piece alphabet (including start/end and duplicate markers) fit in
+# a single 64-bit mask
+_PAIR_BITS: dict[tuple, int] = {}
+
+_POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+@cache
+def _pair_bitmask(seq: str) -> int:
+    """Encode the pair set of a sequence as a 64-bit integer bitmask."""
+    mask = 0
+    for pair in generate_pairs(seq):
+        mask |= 1 << _PAIR_BITS.setdefault(pair, len(_PAIR_BITS))
+    return mask
+
+
+def _popcount(arr: np.ndarray) -> np.ndarray:
+    """Count the set bits of every uint64 element via a byte lookup table."""
+    bytes_view = np.ascontiguousarray(arr).view(np.uint8)
     return (
-        1 - local_similarity(s1, s2, sorensen_dice) + (normalized_hamming(s1, s2))
-    ) / 2
+        _POPCOUNT_TABLE[bytes_view].reshape((*arr.shape, 8)).sum(axis=-1, dtype=np.int64)
+    )
+
+
+def pack_positions(positions: list[str]) -> np.ndarray:
+    """Pack each 8-character position into a single uint64 word."""
+    return np.frombuffer("".join(positions).encode(), dtype="<u8")
+
+
+def _hamming_from_xor(xor: np.ndarray) -> np.ndarray:
+    """
+    Counts the differing squares from XORed packed positions.
+
+    Two positions differ on a square exactly where their XOR has a non-zero
+    byte, so the distance is a branchless OR-fold of each byte onto its
+    lowest bit plus a popcount — no per-character comparison loop.
+
+    Parameters:
+        xor: A uint64 array of XORed packed position pairs.
+
+    Returns:
+        An integer array of the same shape with Hamming distances (0 to 8).
+    """
+    folded = xor.copy()
+    for shift in range(1, 8):
+        np.bitwise_or(folded, xor >> np.uint64(shift), out=folded)
+    np.bitwise_and(folded, np.uint64(0x0101010101010101), out=folded)
+    return _popcount(folded)
+
+
+def pairwise_sorensen_dice_hamming(positions: list[str]) -> np.ndarray:
+    """
+    Computes the full pairwise sorensen_dice_hamming matrix for a list of positions.
+
+    Instead of calling the scalar similarity function for every ordered pair, the
+    positions are encoded once — the board as a packed uint64 for the Hamming
+    part and the pair sets as uint64 bitmasks for the Sorensen-Dice part. The
+    metric is symmetric, so only the upper triangle is computed and the values
+    are mirrored into the lower one, halving both compute and temporaries.
+
+    Parameters:
+        positions: The list of position sequences.
+
+    Returns:
+        An (N, N) float array where entry (i, j) equals sorensen_dice_hamming(positions[i], positions[j]).
+    """
+    n = len(positions)
+    packed = pack_positions(positions)
+    masks = np.array([_pair_bitmask(pos) for pos in positions], dtype=np.uint64)
+    sizes = _popcount(masks)
+
+    rows, cols = np.triu_indices(n)
+    values = np.empty(rows.shape[0])
+
+    def fill_band(start: int, stop: int) -> None:
+        band_rows, band_cols = rows[start:stop], cols[start:stop]
+        hamming = _hamming_from_xor(packed[band_rows] ^ packed[band_cols]) / 8
+        intersection = _popcount(masks[band_rows] & masks[band_cols])
+        dice = 2 * intersection / (sizes[band_rows] + sizes[band_cols])
+        values[start:stop] = ((1 - dice) + hamming) / 2
+
+    # shard the triangle across threads; the NumPy kernels release the GIL,
+    # so the bands run on separate cores without any data copies
+    workers = min(os.cpu_count() or 1, max(1, rows.shape[0] // 65536))
+    bounds = np.linspace(0, rows.shape[0], workers + 1, dtype=int)
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(fill_band, bounds[:-1], bounds[1:]))
+    else:
+        fill_band(0, rows.shape[0])
+
+    matrix = np.zeros((n, n))
+    matrix[rows, cols] = values
+    matrix[cols, rows] = values
+    return matrix
 
 
 def weighted_score(score1: float, score2: float) -> float:
@@ -248,6 +404,7 @@ def weighted_score(score1: float, score2: float) -> float:
 
 
 if __name__ == "__main__":
+    configure_logging()
     # Example usage
     sequence1 = "rrqknbkq"
     sequence2 = "nbnbrrkq"
@@ -1,8 +1,12 @@
+import os
 from collections.abc import Callable, Generator
-from dataclasses import asdict, dataclass
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import cached_property
 from pathlib import Path
 from typing import Any, Self
 
+import numpy as np
 from distance_matrix import DistanceMatrix
 from stockfish import Stockfish
 
@@ -14,36 +18,49 @@ class AnalysisConfig:
     num_top_moves: int
     balanced_threshold: int
 
+    @cached_property
+    def as_dict(self) -> dict[str, int]:
+        """The row representation, built once since the config is immutable
+        for the duration of an analysis run.
+        """
+        return {
+            "stockfish_depth": self.stockfish_depth,
+            "analysis_depth": self.analysis_depth,
+            "num_top_moves": self.num_top_moves,
+            "balanced_threshold": self.balanced_threshold,
+        }
 
-@dataclass
+
+@dataclass(slots=True)
 class WDL:
     win: int
     draw: int
     loss: int
 
 
-@dataclass
-class TopMoveEval:
-    move: str
-    centipawn: int
-    mate: bool
-
-    def __post_init__(self) -> None:
-        self.mate = self.mate is not None
+@dataclass(slots=True)
+class MoveEval:
+    """Evaluation of one position with its top engine continuations.
 
+    The top moves are stored struct-of-arrays style: the move strings in a
+    list and their centipawn scores and mate flags in parallel NumPy arrays
+    (mate lines carry a centipawn of 0), so score reductions over many
+    evaluations are vectorized instead of walking per-move wrapper objects.
+    """
 
-@dataclass
-class MoveEval:
     fen: str
     halfmove: int
     wdl: WDL
-    top_moves: list[TopMoveEval]
+    top_moves: list[str]
+    top_moves_centipawn: np.ndarray
+    top_moves_mate: np.ndarray
     analysis_cfg: AnalysisConfig
 
     def to_row(self) -> dict[str, Any]:
-        top_moves = {f"top_move_{i}": m.move for i, m in enumerate(self.top_moves)}
+        top_moves = {f"top_move_{i}": m for i, m in enumerate(self.top_moves)}
         top_moves_centipawn = {
-            f"top_move_{i}_centipawn": m.centipawn for i, m in enumerate(self.top_moves)
+            f"top_move_{i}_centipawn": int(c)
+            for i, c in enumerate(self.top_moves_centipawn)
         }
         return {
             "fen": self.fen,
@@ -52,18 +69,18 @@ class MoveEval:
             "win": self.wdl.win,
             "draw": self.wdl.draw,
             "loss": self.wdl.loss,
-            **asdict(self.analysis_cfg),
+            **self.analysis_cfg.as_dict,
             **top_moves,
             **top_moves_centipawn,
         }
 
 
-@dataclass
+@dataclass(slots=True)
 class FirstMoveEval(MoveEval):
     distance: float
 
 
-@dataclass
+@dataclass(slots=True)
 class PositionResult:
     fen: str
     wdl: WDL
@@ -82,17 +99,23 @@ class PositionResult:
         The sharpeness is calculated by getting the top moves from all the deepest analyzed moves and
         checking how many of them are below the balanced threshold.
         """
-        top_moves = [
-            top_move for move in deepest_moves_eval for top_move in move.top_moves
-        ]
-        sharpness_score = sum(
-            1
-            for top_move in top_moves
-            if (not top_move.mate) and (top_move.centipawn < balanced_threshold)
-        ) / len(top_moves)
-        initial_centipawn = max(
-            first_move_eval.top_moves, key=lambda x: x.centipawn
-        ).centipawn
+        # one vectorized reduction over the concatenated score arrays instead
+        # of attribute lookups per top move
+        centipawns = np.concatenate(
+            [move.top_moves_centipawn for move in deepest_moves_eval]
+        )
+        mates = np.concatenate([move.top_moves_mate for move in deepest_moves_eval])
+        total_moves = centipawns.size
+        balanced_moves = int((~mates & (centipawns < balanced_threshold)).sum())
+        sharpness_score = balanced_moves / total_moves if total_moves else 0.0
+        # mate lines carry a placeholder centipawn of 0, so keep them out of
+        # the initial evaluation unless every top line mates
+        first_scores = first_move_eval.top_moves_centipawn
+        first_mates = first_move_eval.top_moves_mate
+        if first_mates.all():
+            initial_centipawn = int(first_scores.max())
+        else:
+            initial_centipawn = int(first_scores[~first_mates].max())
         return cls(
             fen=first_move_eval.fen,
             wdl=first_move_eval.wdl,
@@ -118,27 +141,55 @@ def convert_starting_positions_to_fen(white: str, black: str) -> str:
 @dataclass
 class StockfishAnalyzer:
     stockfish: Stockfish
-    distance_matrix: DistanceMatrix
-
     cfg: AnalysisConfig
-    sample_strategies: list[Callable[[], tuple[str, str]]]
+
+    distance_matrix: DistanceMatrix | None = None
+    sample_strategies: list[Callable[[], tuple[str, str]]] = field(
+        default_factory=list
+    )
+    # engine results per FEN; the analysis tree reaches the same position
+    # through different move orders (transpositions), and an engine query
+    # costs orders of magnitude more than the lookup. Keyed by FEN alone
+    # since cfg is fixed for the analyzer's lifetime.
+    _move_cache: dict[str, tuple[WDL, list[str], np.ndarray, np.ndarray]] = field(
+        default_factory=dict, repr=False
+    )
 
     def _get_move_analysis(self, fen: str, halfmove: int) -> MoveEval:
-        self.stockfish.set_fen_position(fen)
+        cached = self._move_cache.get(fen)
+        if cached is None:
+            self.stockfish.set_fen_position(fen)
 
-        wdl = self.stockfish.get_wdl_stats()
-        if not wdl:
-            msg = "No WDL stats found"
-            raise ValueError(msg)
+            wdl = self.stockfish.get_wdl_stats()
+            if not wdl:
+                msg = "No WDL stats found"
+                raise ValueError(msg)
 
+            moves = self.stockfish.get_top_moves(self.cfg.num_top_moves)
+            cached = (
+                WDL(*wdl),
+                [move["Move"] for move in moves],
+                np.fromiter(
+                    (move["Centipawn"] or 0 for move in moves),
+                    dtype=np.int32,
+                    count=len(moves),
+                ),
+                np.fromiter(
+                    (move["Mate"] is not None for move in moves),
+                    dtype=bool,
+                    count=len(moves),
+                ),
+            )
+            self._move_cache[fen] = cached
+
+        wdl_stats, top_moves, centipawns, mates = cached
         return MoveEval(
             fen=fen,
             halfmove=halfmove,
-            wdl=WDL(*wdl),
-            top_moves=[
-                TopMoveEval(**move)
-                for move in self.stockfish.get_top_moves(self.cfg.num_top_moves)
-            ],
+            wdl=wdl_stats,
+            top_moves=top_moves,
+            top_moves_centipawn=centipawns,
+            top_moves_mate=mates,
             analysis_cfg=self.cfg,
         )
 
@@ -147,25 +198,137 @@ class StockfishAnalyzer:
         fen: str,
         halfmove: int,
     ) -> Generator[MoveEval, None, None]:
-        move_eval = self._get_move_analysis(fen, halfmove)
-        yield move_eval
-
-        if halfmove < (self.cfg.analysis_depth * 2 - 1):
-            for top_move in move_eval.top_moves:
-                self.stockfish.set_fen_position(fen)
-                new_fen = self.stockfish.make_moves_from_current_position(
-                    [top_move.move]
-                )
-                if new_fen is None:
-                    msg = "Invalid move"
-                    raise ValueError(msg)
-                yield from self.analyze_moves_from_position(new_fen, halfmove + 1)
+        """Walk the top-move tree depth-first and yield every evaluation.
+
+        The traversal uses an explicit stack instead of recursing through
+        nested generators, so deep analysis configs do not stack one
+        suspended frame per ply and the yield order stays the same preorder
+        the recursive version produced.
+
+        Decided lines are pruned: a top move that mates or whose score is
+        already at or beyond the balanced threshold cannot contribute
+        balanced continuations deeper down, so its subtree is skipped
+        instead of spending engine calls re-analyzing it.
+        """
+        # hoist the config-derived bounds and the per-child engine calls out
+        # of the loop; the tree can reach thousands of nodes per sweep and
+        # attribute dispatch per child adds up
+        max_halfmove = self.cfg.analysis_depth * 2 - 1
+        balanced_threshold = self.cfg.balanced_threshold
+        get_move_analysis = self._get_move_analysis
+        set_fen_position = self.stockfish.set_fen_position
+        make_moves = self.stockfish.make_moves_from_current_position
+        stack = [(fen, halfmove)]
+        while stack:
+            fen, halfmove = stack.pop()
+            move_eval = get_move_analysis(fen, halfmove)
+            yield move_eval
+
+            if halfmove < max_halfmove:
+                children = []
+                for top_move, centipawn, is_mate in zip(
+                    move_eval.top_moves,
+                    move_eval.top_moves_centipawn,
+                    move_eval.top_moves_mate,
+                    strict=True,
+                ):
+                    if is_mate or abs(int(centipawn)) >= balanced_threshold:
+                        continue
+                    set_fen_position(fen)
+                    new_fen = make_moves([top_move])
+                    if new_fen is None:
+                        msg = "Invalid move"
+                        raise ValueError(msg)
+                    children.append((new_fen, halfmove + 1))
+                # reversed so the first top move is popped (and yielded) first
+                stack.extend(reversed(children))
 
     def get_new_position_fen(self) -> str:
+        if self.distance_matrix is None:
+            msg = "No distance matrix configured"
+            raise ValueError(msg)
+        # transpositions only recur within one starting position's tree
+        self._move_cache.clear()
         starting_positions = self.distance_matrix.get_weighted_random_sample()
         return convert_starting_positions_to_fen(*starting_positions)
 
 
+_worker_analyzer: StockfishAnalyzer | None = None
+
+
+def _init_analysis_worker(
+    cfg: AnalysisConfig, stockfish_parameters: dict[str, Any]
+) -> None:
+    """Create one Stockfish engine per worker process."""
+    global _worker_analyzer  # noqa: PLW0603
+    _worker_analyzer = StockfishAnalyzer(
+        Stockfish(depth=cfg.stockfish_depth, parameters=stockfish_parameters),
+        cfg=cfg,
+    )
+
+
+def _analyze_position_worker(fen: str) -> list[MoveEval]:
+    if _worker_analyzer is None:
+        msg = "Worker not initialized"
+        raise RuntimeError(msg)
+    return list(_worker_analyzer.analyze_moves_from_position(fen, 0))
+
+
+def analyze_positions_parallel(
+    fens: list[str],
+    cfg: AnalysisConfig,
+    stockfish_parameters: dict[str, Any],
+    max_workers: int | None = None,
+    sink: Callable[[list[MoveEval]], None] | None = None,
+) -> list[list[MoveEval]]:
+    """Analyze a batch of starting positions across worker processes.
+
+    Each position is independent, so the batch is embarrassingly parallel.
+    Every worker process holds its own Stockfish engine (created once in the
+    initializer), avoiding both engine re-spawns per position and sharing a
+    single engine across processes.
+
+    Args:
+        fens: The FEN strings of the starting positions to analyze
+        cfg: The analysis configuration
+        stockfish_parameters: The UCI parameters for each worker's engine
+        max_workers: The number of worker processes; defaults to the CPU
+            count divided by the engine's Threads setting so the workers'
+            search threads together fill the machine without oversubscribing
+        sink: Optional callback that persists one position's evaluations.
+            It runs on a single background thread as results complete, so
+            serialization overlaps the remaining engine work instead of
+            stalling the result loop
+
+    Returns:
+        A list with the move evaluations of every position, in input order
+    """
+    if max_workers is None:
+        engine_threads = int(stockfish_parameters.get("Threads", 1))
+        max_workers = max(1, (os.cpu_count() or 1) // engine_threads)
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_analysis_worker,
+        initargs=(cfg, stockfish_parameters),
+    ) as executor:
+        if sink is None:
+            return list(executor.map(_analyze_position_worker, fens))
+        results = []
+        # one writer thread keeps sink calls ordered and off the result
+        # loop; waiting on the previous future before submitting the next
+        # propagates sink failures instead of silently dropping results
+        with ThreadPoolExecutor(max_workers=1) as writer:
+            pending = None
+            for result in executor.map(_analyze_position_worker, fens):
+                if pending is not None:
+                    pending.result()
+                pending = writer.submit(sink, result)
+                results.append(result)
+            if pending is not None:
+                pending.result()
+        return results
+
+
 if __name__ == "__main__":
     cfg = AnalysisConfig(
         stockfish_depth=30,
@@ -178,7 +341,8 @@ if __name__ == "__main__":
             depth=cfg.stockfish_depth,
             parameters={"UCI_Chess960": "true", "Hash": 2048, "Threads": 7},
         ),
-        DistanceMatrix.from_parquet(Path("data/distance_matrix.parquet")),
         cfg=cfg,
-        sample_strategies=[],
+        distance_matrix=DistanceMatrix.from_parquet(
+            Path("data/distance_matrix.parquet")
+        ),
     )
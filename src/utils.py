@@ -1,4 +1,16 @@
 import logging
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.DEBUG)
+
+
+def configure_logging(level: int = logging.INFO) -> None:
+    """Set up logging for script entry points.
+
+    Importing a module must not reconfigure the process-wide logging setup
+    (or pay for formatting DEBUG records nobody reads), so this is called
+    explicitly from __main__ blocks instead of running at import.
+
+    Args:
+        level: The root log level for the run
+    """
+    logging.basicConfig(level=level)